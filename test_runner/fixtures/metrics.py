@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from prometheus_client.parser import text_string_to_metric_families
 from prometheus_client.samples import Sample
@@ -87,7 +87,15 @@ class MetricsGetter:
         return result
 
 
-def parse_metrics(text: str, name: str = "") -> Metrics:
+def parse_metrics(text: str, name: str = "", only: Optional[Iterable[str]] = None) -> Metrics:
+    """
+    Parse a Prometheus exposition. If 'only' is given, lines for other sample
+    names (and all HELP/TYPE comments) are dropped before parsing, which is much
+    cheaper on large expositions when only a few metrics are needed.
+    """
+    if only is not None:
+        prefixes = tuple(f"{n}{sep}" for n in only for sep in ("{", " "))
+        text = "\n".join(line for line in text.splitlines() if line.startswith(prefixes))
     metrics = Metrics(name)
     gen = text_string_to_metric_families(text)
     for family in gen:
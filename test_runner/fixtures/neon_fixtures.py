@@ -3,7 +3,6 @@ from __future__ import annotations
 import abc
 import asyncio
 import concurrent.futures
-import filecmp
 import json
 import os
 import re
@@ -16,13 +15,25 @@ import time
 import uuid
 from contextlib import closing, contextmanager
 from dataclasses import dataclass, field
-from datetime import datetime
 from fcntl import LOCK_EX, LOCK_UN, flock
-from functools import cached_property
-from itertools import chain, product
+from functools import cached_property, lru_cache
+from itertools import chain, cycle, product
 from pathlib import Path
 from types import TracebackType
-from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union, cast
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 from urllib.parse import quote, urlparse
 
 import asyncpg
@@ -30,6 +41,7 @@ import backoff
 import httpx
 import jwt
 import psycopg2
+import psycopg2.errors
 import pytest
 import requests
 import toml
@@ -236,6 +248,18 @@ def get_dir_size(path: str) -> int:
     return totalbytes
 
 
+def get_binary_version(binary_path: Path) -> str:
+    """Return the output of `<binary> --version`."""
+    res = subprocess.run(
+        [str(binary_path), "--version"],
+        check=True,
+        universal_newlines=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return res.stdout
+
+
 @pytest.fixture(scope="session")
 def port_distributor(worker_base_port: int, worker_port_num: int) -> PortDistributor:
     return PortDistributor(base_port=worker_base_port, port_number=worker_port_num)
@@ -788,6 +812,15 @@ class NeonEnvBuilder:
         # assert all overlayfs mounts in our test directory are gone
         assert [] == list(overlayfs.iter_mounts_beneath(self.test_overlay_dir))
 
+    def pageserver_testing_enabled_or_skip(self):
+        """
+        Like NeonPageserver.is_testing_enabled_or_skip, but usable before the env
+        is started, so that tests needing the 'testing' feature don't pay for
+        starting a whole env just to be skipped.
+        """
+        if '"testing"' not in get_binary_version(self.neon_binpath / "pageserver"):
+            pytest.skip("pageserver was built without 'testing' feature")
+
     def enable_scrub_on_exit(self):
         """
         Call this if you would like the fixture to automatically run
@@ -867,7 +900,7 @@ class NeonEnvBuilder:
                 test_file = test_entry
                 if ATTACHMENT_NAME_REGEX.fullmatch(test_file.name):
                     continue
-                if SMALL_DB_FILE_NAME_REGEX.fullmatch(test_file.name):
+                if is_small_db_file(test_file.name):
                     continue
                 log.debug(f"Removing large database {test_file} file")
                 test_file.unlink()
@@ -989,6 +1022,7 @@ class NeonEnv:
         self.pg_version = config.pg_version
         # Binary path for pageserver, safekeeper, etc
         self.neon_binpath = config.neon_binpath
+        self._binary_versions: Dict[str, str] = {}
         # Binary path for neon_local test-specific binaries: may be overridden
         # after construction for compat testing
         self.neon_local_binpath = config.neon_binpath
@@ -1181,15 +1215,12 @@ class NeonEnv:
         return ",".join(f"localhost:{wa.port.pg}" for wa in self.safekeepers)
 
     def get_binary_version(self, binary_name: str) -> str:
-        bin_pageserver = str(self.neon_binpath / binary_name)
-        res = subprocess.run(
-            [bin_pageserver, "--version"],
-            check=True,
-            universal_newlines=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        return res.stdout
+        # The binaries don't change while the env exists, so only run each one once.
+        version = self._binary_versions.get(binary_name)
+        if version is None:
+            version = get_binary_version(self.neon_binpath / binary_name)
+            self._binary_versions[binary_name] = version
+        return version
 
     @cached_property
     def auth_keys(self) -> AuthKeys:
@@ -1411,10 +1442,7 @@ class AbstractNeonCli(abc.ABC):
         log.info('Running command "{}"'.format(" ".join(args)))
 
         env_vars = os.environ.copy()
-        env_vars["NEON_REPO_DIR"] = str(self.env.repo_dir)
-        env_vars["POSTGRES_DISTRIB_DIR"] = str(self.env.pg_distrib_dir)
-        if self.env.rust_log_override is not None:
-            env_vars["RUST_LOG"] = self.env.rust_log_override
+        env_vars.update(self._env_overrides)
         for extra_env_key, extra_env_value in (extra_env_vars or {}).items():
             env_vars[extra_env_key] = extra_env_value
 
@@ -1480,6 +1508,17 @@ class AbstractNeonCli(abc.ABC):
             )
         return res
 
+    @cached_property
+    def _env_overrides(self) -> Dict[str, str]:
+        """Environment variables that are the same for every invocation of the CLI."""
+        overrides = {
+            "NEON_REPO_DIR": str(self.env.repo_dir),
+            "POSTGRES_DISTRIB_DIR": str(self.env.pg_distrib_dir),
+        }
+        if self.env.rust_log_override is not None:
+            overrides["RUST_LOG"] = self.env.rust_log_override
+        return overrides
+
 
 class NeonCli(AbstractNeonCli):
     """
@@ -2316,6 +2355,52 @@ class NeonPageserver(PgProtocol):
 
         return None
 
+    def log_contains_all(self, patterns: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Like log_contains, for several regexes in a single pass over the log. Returns
+        the first matching line for each pattern, or None if it was not found.
+        """
+        found: Dict[str, Optional[str]] = dict.fromkeys(patterns)
+        logfile = self.workdir / "pageserver.log"
+        if not logfile.exists():
+            log.warning(f"Skipping log check: {logfile} does not exist")
+            return found
+
+        remaining = {pattern: re.compile(pattern) for pattern in patterns}
+        with logfile.open("r") as f:
+            for line in f:
+                for pattern, contains_re in list(remaining.items()):
+                    if contains_re.search(line):
+                        found[pattern] = line
+                        del remaining[pattern]
+                if not remaining:
+                    break
+
+        return found
+
+    def wait_for_log_line(self, pattern: str, timeout: float = 20) -> str:
+        """
+        Wait until the pageserver log contains a line that matches the given regex, and
+        return that line. Unlike polling `log_contains`, the log is read only once: after
+        the existing contents, just the newly appended lines are checked.
+        """
+        logfile = self.workdir / "pageserver.log"
+        contains_re = re.compile(pattern)
+        deadline = time.monotonic() + timeout
+        with logfile.open("r") as f:
+            line = ""
+            while True:
+                # readline() may return a partially written line, keep it until it's complete
+                line += f.readline()
+                if line.endswith("\n"):
+                    if contains_re.search(line):
+                        return line
+                    line = ""
+                    continue
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"timed out waiting for {pattern!r} in {logfile}")
+                time.sleep(0.05)
+
     def tenant_attach(
         self,
         tenant_id: TenantId,
@@ -2483,6 +2568,27 @@ def pg_bin(test_output_dir: Path, pg_distrib_dir: Path, pg_version: PgVersion) -
     return PgBin(test_output_dir, pg_distrib_dir, pg_version)
 
 
+_cpus_for_pinning: Optional[Iterator[int]] = None
+
+
+def pin_to_next_cpu(pid: int):
+    """
+    If NEON_PIN_CPU=1 is set, restrict the given process to a single CPU, cycling
+    through the CPUs available to the test runner. This keeps latency-sensitive
+    helper processes from migrating between cores. Processes forked by `pid`
+    afterwards inherit the affinity.
+    """
+    global _cpus_for_pinning
+
+    if os.getenv("NEON_PIN_CPU") != "1" or not hasattr(os, "sched_setaffinity"):
+        return
+    if _cpus_for_pinning is None:
+        _cpus_for_pinning = cycle(sorted(os.sched_getaffinity(0)))
+    cpu = next(_cpus_for_pinning)
+    log.info(f"Pinning pid {pid} to cpu {cpu}")
+    os.sched_setaffinity(pid, {cpu})
+
+
 # TODO make port an optional argument
 class VanillaPostgres(PgProtocol):
     def __init__(self, pgdatadir: Path, pg_bin: PgBin, port: int, init: bool = True):
@@ -2548,6 +2654,9 @@ class VanillaPostgres(PgProtocol):
         self.pg_bin.run_capture(
             ["pg_ctl", "-w", "-D", str(self.pgdatadir), "-l", log_path, "start"]
         )
+        # The first line of postmaster.pid is the postmaster's pid
+        with open(os.path.join(self.pgdatadir, "postmaster.pid")) as pid_file:
+            pin_to_next_cpu(int(pid_file.readline()))
 
     def stop(self):
         assert self.running
@@ -2632,14 +2741,14 @@ def remote_pg(
     host = parse_dsn(connstr).get("host", "")
     is_neon = host.endswith(".neon.build")
 
-    start_ms = int(datetime.utcnow().timestamp() * 1000)
+    start_ms = time.time_ns() // 1_000_000
     with RemotePostgres(pg_bin, connstr) as remote_pg:
         if is_neon:
             timeline_id = TimelineId(remote_pg.safe_psql("SHOW neon.timeline_id")[0][0])
 
         yield remote_pg
 
-    end_ms = int(datetime.utcnow().timestamp() * 1000)
+    end_ms = time.time_ns() // 1_000_000
     if is_neon:
         # Add 10s margin to the start and end times
         allure_add_grafana_links(
@@ -2684,6 +2793,12 @@ class PSQL:
         )
 
 
+@lru_cache(maxsize=32)
+def _quote_credentials(user: str, password: str) -> str:
+    """Percent-encode the userinfo part of a proxy connection string."""
+    return f"{quote(user)}:{quote(password)}"
+
+
 class NeonProxy(PgProtocol):
     link_auth_uri: str = "http://dummy-uri"
 
@@ -2699,20 +2814,23 @@ class NeonProxy(PgProtocol):
             pass
 
     class Link(AuthBackend):
-        def extra_args(self) -> list[str]:
-            return [
+        def __init__(self):
+            self._args = (
                 # Link auth backend params
                 *["--auth-backend", "link"],
                 *["--uri", NeonProxy.link_auth_uri],
                 *["--allow-self-signed-compute", "true"],
-            ]
+            )
+
+        def extra_args(self) -> list[str]:
+            return list(self._args)
 
     class Console(AuthBackend):
         def __init__(self, endpoint: str, fixed_rate_limit: Optional[int] = None):
             self.endpoint = endpoint
             self.fixed_rate_limit = fixed_rate_limit
 
-        def extra_args(self) -> list[str]:
+            # The arguments don't change after construction, so build them once.
             args = [
                 # Console auth backend params
                 *["--auth-backend", "console"],
@@ -2729,22 +2847,30 @@ class NeonProxy(PgProtocol):
                     *["--aimd-increase-by", "1"],
                     *["--wake-compute-cache", "size=0"],  # Disable cache to test rate limiter.
                 ]
-            return args
+            self._args = tuple(args)
+
+        def extra_args(self) -> list[str]:
+            return list(self._args)
 
     @dataclass(frozen=True)
     class Postgres(AuthBackend):
         pg_conn_url: str
+        _args: tuple[str, ...] = field(init=False, repr=False, compare=False)
+
+        def __post_init__(self):
+            args = (
+                # Postgres auth backend params
+                *["--auth-backend", "postgres"],
+                *["--auth-endpoint", self.pg_conn_url],
+            )
+            object.__setattr__(self, "_args", args)
 
         @property
         def default_conn_url(self) -> Optional[str]:
             return self.pg_conn_url
 
         def extra_args(self) -> list[str]:
-            return [
-                # Postgres auth backend params
-                *["--auth-backend", "postgres"],
-                *["--auth-endpoint", self.pg_conn_url],
-            ]
+            return list(self._args)
 
     def __init__(
         self,
@@ -2774,6 +2900,7 @@ class NeonProxy(PgProtocol):
         self.metric_collection_endpoint = metric_collection_endpoint
         self.metric_collection_interval = metric_collection_interval
         self._popen: Optional[subprocess.Popen[bytes]] = None
+        self._logfile: Optional[BinaryIO] = None
 
     def start(self) -> NeonProxy:
         assert self._popen is None
@@ -2825,8 +2952,10 @@ class NeonProxy(PgProtocol):
                 *["--metric-collection-interval", self.metric_collection_interval],
             ]
 
-        logfile = open(self.test_output_dir / "proxy.log", "w")
+        logfile = open(self.test_output_dir / "proxy.log", "wb")
+        self._logfile = logfile
         self._popen = subprocess.Popen(args, stdout=logfile, stderr=logfile)
+        pin_to_next_cpu(self._popen.pid)
         self._wait_until_ready()
         return self
 
@@ -2845,13 +2974,14 @@ class NeonProxy(PgProtocol):
     def _wait_until_ready(self):
         requests.get(f"http://{self.host}:{self.http_port}/v1/status")
 
+    def _connstr(self, user: str, password: str) -> str:
+        return f"postgresql://{_quote_credentials(user, password)}@{self.domain}:{self.proxy_port}/postgres"
+
     def http_query(self, query, args, **kwargs):
         # TODO maybe use default values if not provided
-        user = quote(kwargs["user"])
-        password = quote(kwargs["password"])
         expected_code = kwargs.get("expected_code")
 
-        connstr = f"postgresql://{user}:{password}@{self.domain}:{self.proxy_port}/postgres"
+        connstr = self._connstr(kwargs["user"], kwargs["password"])
         response = requests.post(
             f"https://{self.domain}:{self.external_http_port}/sql",
             data=json.dumps({"query": query, "params": args}),
@@ -2869,11 +2999,9 @@ class NeonProxy(PgProtocol):
 
     async def http2_query(self, query, args, **kwargs):
         # TODO maybe use default values if not provided
-        user = kwargs["user"]
-        password = kwargs["password"]
         expected_code = kwargs.get("expected_code")
 
-        connstr = f"postgresql://{user}:{password}@{self.domain}:{self.proxy_port}/postgres"
+        connstr = self._connstr(kwargs["user"], kwargs["password"])
         async with httpx.AsyncClient(
             http2=True, verify=str(self.test_output_dir / "proxy.crt")
         ) as client:
@@ -2909,12 +3037,35 @@ class NeonProxy(PgProtocol):
 
     @staticmethod
     async def find_auth_link(link_auth_uri, proc):
-        for _ in range(100):
-            line = (await proc.stderr.readline()).decode("utf-8").strip()
-            log.info(f"psql line: {line}")
-            if link_auth_uri in line:
-                log.info(f"SUCCESS, found auth url: {line}")
-                return line
+        # Scan the raw bytes for the link instead of decoding and checking psql's
+        # output line by line. Read in chunks rather than with readuntil(), which
+        # has a 64 KiB limit and loses the output read so far on timeout.
+        needle = link_auth_uri.encode("utf-8")
+        output = b""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 10
+        while True:
+            start = output.find(needle)
+            if start >= 0 and b"\n" in output[start:]:
+                break
+            try:
+                chunk = await asyncio.wait_for(proc.stderr.read(65536), deadline - loop.time())
+            except asyncio.TimeoutError:
+                raise AssertionError(
+                    f"timed out waiting for auth link, psql output so far: "
+                    f"{output.decode('utf-8', errors='replace')}"
+                ) from None
+            if not chunk:
+                break
+            output += chunk
+
+        if start < 0:
+            log.info(f"psql output: {output.decode('utf-8', errors='replace')}")
+            return None
+        line_start = output.rfind(b"\n", 0, start) + 1
+        line = output[line_start:].split(b"\n", 1)[0].decode("utf-8").strip()
+        log.info(f"SUCCESS, found auth url: {line}")
+        return line
 
     def __enter__(self) -> NeonProxy:
         return self
@@ -2933,6 +3084,10 @@ class NeonProxy(PgProtocol):
                 log.warning("failed to gracefully terminate proxy; killing")
                 self._popen.kill()
 
+        if self._logfile is not None:
+            self._logfile.close()
+            self._logfile = None
+
     @staticmethod
     async def activate_link_auth(
         local_vanilla_pg, proxy_with_metric_collector, psql_session_id, create_user=True
@@ -3196,15 +3351,27 @@ class Endpoint(PgProtocol):
             json.dump(dict(data_dict, **kwargs), file, indent=4)
 
     # Please note: Migrations only run if pg_skip_catalog_updates is false
-    def wait_for_migrations(self):
+    def wait_for_migrations(self, timeout: float = 10):
         with self.cursor() as cur:
-
-            def check_migrations_done():
-                cur.execute("SELECT id FROM neon_migration.migration_id")
-                migration_id = cur.fetchall()[0][0]
-                assert migration_id != 0
-
-            wait_until(20, 0.5, check_migrations_done)
+            # Poll often: migrations usually finish well within a second. Only
+            # retry while they haven't run yet, so that other errors (e.g. a
+            # dropped connection) surface right away.
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    cur.execute("SELECT id FROM neon_migration.migration_id")
+                    migration_id = cur.fetchall()[0][0]
+                    assert migration_id != 0
+                    return
+                except (
+                    AssertionError,
+                    psycopg2.errors.InvalidSchemaName,
+                    psycopg2.errors.UndefinedTable,
+                ):
+                    if time.monotonic() >= deadline:
+                        raise
+                log.info("waiting for migrations to complete")
+                time.sleep(0.05)
 
     # Mock the extension part of spec passed from control plane for local testing
     # endpooint.rs adds content of this file as a part of the spec.json
@@ -3422,21 +3589,25 @@ class Safekeeper:
         assert self.running is False
         self.env.neon_cli.safekeeper_start(self.id, extra_opts=extra_opts)
         self.running = True
-        # wait for wal acceptor start by checking its status
-        started_at = time.time()
-        while True:
-            try:
-                with self.http_client() as http_cli:
+        # wait for wal acceptor start by checking its status, backing off
+        # exponentially from 10ms so that a quick start isn't padded by a long sleep
+        started_at = time.monotonic()
+        delay = 0.01
+        # One client for the whole poll, so that its connection pool is reused
+        with self.http_client() as http_cli:
+            while True:
+                try:
                     http_cli.check_status()
-            except Exception as e:
-                elapsed = time.time() - started_at
-                if elapsed > 3:
-                    raise RuntimeError(
-                        f"timed out waiting {elapsed:.0f}s for wal acceptor start: {e}"
-                    ) from e
-                time.sleep(0.5)
-            else:
-                break  # success
+                except Exception as e:
+                    elapsed = time.monotonic() - started_at
+                    if elapsed > 3:
+                        raise RuntimeError(
+                            f"timed out waiting {elapsed:.0f}s for wal acceptor start: {e}"
+                        ) from e
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                else:
+                    break  # success
         return self
 
     def stop(self, immediate: bool = False) -> "Safekeeper":
@@ -3489,11 +3660,13 @@ class Safekeeper:
         Get list of segment names of the given timeline.
         """
         tli_dir = self.timeline_dir(tenant_id, timeline_id)
-        segments = []
-        for _, _, filenames in os.walk(tli_dir):
-            segments.extend([f for f in filenames if not f.startswith("safekeeper.control")])
-        segments.sort()
-        return segments
+        with os.scandir(tli_dir) as entries:
+            return sorted(
+                entry.name
+                for entry in entries
+                if entry.is_file(follow_symlinks=False)
+                and not entry.name.startswith("safekeeper.control")
+            )
 
 
 # Walreceiver as returned by sk's timeline status endpoint.
@@ -3516,6 +3689,12 @@ class SafekeeperTimelineStatus:
     walreceivers: List[Walreceiver]
 
 
+SAFEKEEPER_LSN_METRIC_EXTRACTOR: re.Pattern = re.compile(  # type: ignore[type-arg]
+    rb'^safekeeper_(?P<kind>flush_lsn|commit_lsn){tenant_id="(?P<tenant_id>[0-9a-f]+)",timeline_id="(?P<timeline_id>[0-9a-f]+)"} (?P<value>\S+)$',
+    re.MULTILINE,
+)
+
+
 @dataclass
 class SafekeeperMetrics:
     # These are metrics from Prometheus which uses float64 internally.
@@ -3567,7 +3746,9 @@ class SafekeeperHttpClient(requests.Session):
         params = params or {}
         res = self.get(f"http://localhost:{self.port}/v1/debug_dump", params=params)
         res.raise_for_status()
-        res_json = json.loads(res.text)
+        # Parse the raw body: the dump can be large, and going through res.text
+        # decodes it into an intermediate str first.
+        res_json = json.loads(res.content)
         assert isinstance(res_json, dict)
         return res_json
 
@@ -3687,26 +3868,24 @@ class SafekeeperHttpClient(requests.Session):
         request_result.raise_for_status()
         return request_result.text
 
+    def get_metrics_bytes(self) -> bytes:
+        request_result = self.get(f"http://localhost:{self.port}/metrics")
+        request_result.raise_for_status()
+        return request_result.content
+
     def get_metrics(self) -> SafekeeperMetrics:
-        all_metrics_text = self.get_metrics_str()
+        # Scan the raw response, there's no need to decode all of it.
+        all_metrics = self.get_metrics_bytes()
 
         metrics = SafekeeperMetrics()
-        for match in re.finditer(
-            r'^safekeeper_flush_lsn{tenant_id="([0-9a-f]+)",timeline_id="([0-9a-f]+)"} (\S+)$',
-            all_metrics_text,
-            re.MULTILINE,
-        ):
-            metrics.flush_lsn_inexact[(TenantId(match.group(1)), TimelineId(match.group(2)))] = int(
-                match.group(3)
-            )
-        for match in re.finditer(
-            r'^safekeeper_commit_lsn{tenant_id="([0-9a-f]+)",timeline_id="([0-9a-f]+)"} (\S+)$',
-            all_metrics_text,
-            re.MULTILINE,
-        ):
-            metrics.commit_lsn_inexact[
-                (TenantId(match.group(1)), TimelineId(match.group(2)))
-            ] = int(match.group(3))
+        for match in SAFEKEEPER_LSN_METRIC_EXTRACTOR.finditer(all_metrics):
+            if match.group("kind") == b"flush_lsn":
+                lsns = metrics.flush_lsn_inexact
+            else:
+                lsns = metrics.commit_lsn_inexact
+            tenant_id = TenantId(match.group("tenant_id").decode("ascii"))
+            timeline_id = TimelineId(match.group("timeline_id").decode("ascii"))
+            lsns[(tenant_id, timeline_id)] = int(match.group("value"))
         return metrics
 
 
@@ -3811,9 +3990,19 @@ def pytest_addoption(parser: Parser):
     )
 
 
-SMALL_DB_FILE_NAME_REGEX: re.Pattern = re.compile(  # type: ignore[type-arg]
-    r"config|config-v1|heatmap-v1|metadata|.+\.(?:toml|pid|json|sql|conf)"
-)
+SMALL_DB_FILE_NAMES = frozenset(("config", "config-v1", "heatmap-v1", "metadata"))
+SMALL_DB_FILE_SUFFIXES = (".toml", ".pid", ".json", ".sql", ".conf")
+
+
+def is_small_db_file(name: str) -> bool:
+    """
+    Check whether a file under the repo dir is small enough to keep after the test.
+    Called for every file in the repo, so it avoids a regex.
+    """
+    if name in SMALL_DB_FILE_NAMES:
+        return True
+    # A bare suffix like ".toml" has no name before the dot, so it doesn't count.
+    return name.endswith(SMALL_DB_FILE_SUFFIXES) and name not in SMALL_DB_FILE_SUFFIXES
 
 
 # This is autouse, so the test output directory always gets created, even
@@ -3851,11 +4040,21 @@ class FileAndThreadLock:
         self.fd: Optional[int] = None
 
     def __enter__(self):
-        self.fd = os.open(self.path, os.O_CREAT | os.O_WRONLY)
         # lock thread lock before file lock so that there's no race
         # around flocking / funlocking the file lock
         self.thread_lock.acquire()
-        flock(self.fd, LOCK_EX)
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_WRONLY)
+            try:
+                flock(fd, LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+        except BaseException:
+            # don't leave the thread lock held, every other thread would hang on it
+            self.thread_lock.release()
+            raise
+        self.fd = fd
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         assert self.fd is not None
@@ -3928,17 +4127,25 @@ def test_overlay_dir(request: FixtureRequest, top_output_dir: Path) -> Optional[
     overlay_dir = get_test_overlay_dir(request, top_output_dir)
     log.info(f"test_overlay_dir is {overlay_dir}")
 
-    overlay_dir.mkdir(exist_ok=True)
-    # unmount stale overlayfs mounts which subdirectories of `overlay_dir/*` as the overlayfs `upperdir` and `workdir`
-    for mountpoint in overlayfs.iter_mounts_beneath(get_test_output_dir(request, top_output_dir)):
-        cmd = ["sudo", "umount", str(mountpoint)]
-        log.info(
-            f"Unmounting stale overlayfs mount probably created during earlier test run: {cmd}"
-        )
-        subprocess.run(cmd, capture_output=True, check=True)
-    # the overlayfs `workdir`` is owned by `root`, shutil.rmtree won't work.
-    cmd = ["sudo", "rm", "-rf", str(overlay_dir)]
-    subprocess.run(cmd, capture_output=True, check=True)
+    # Nothing to clean up on the first run after a clean checkout: a stale mount needs
+    # its `upperdir` and `workdir` under `overlay_dir`, and a mountpoint under the test
+    # output dir, so skip scanning the mount table if either of them is missing.
+    test_output_dir = get_test_output_dir(request, top_output_dir)
+    if overlay_dir.exists():
+        if test_output_dir.exists():
+            # unmount stale overlayfs mounts which subdirectories of `overlay_dir/*` as the overlayfs `upperdir` and `workdir`
+            for mountpoint in overlayfs.iter_mounts_beneath(test_output_dir):
+                cmd = ["sudo", "umount", str(mountpoint)]
+                log.info(
+                    f"Unmounting stale overlayfs mount probably created during earlier test run: {cmd}"
+                )
+                subprocess.run(cmd, capture_output=True, check=True)
+        try:
+            shutil.rmtree(overlay_dir)
+        except OSError:
+            # the overlayfs `workdir` is owned by `root`, shutil.rmtree won't work on it.
+            cmd = ["sudo", "rm", "-rf", str(overlay_dir)]
+            subprocess.run(cmd, capture_output=True, check=True)
 
     overlay_dir.mkdir()
 
@@ -3974,6 +4181,8 @@ SKIP_FILES = frozenset(
     )
 )
 
+TEMP_TABLE_FILE_REGEX: re.Pattern = re.compile(r"t[0-9]+_[0-9]+")  # type: ignore[type-arg]
+
 
 def should_skip_dir(dirname: str) -> bool:
     return dirname in SKIP_DIRS
@@ -3984,39 +4193,93 @@ def should_skip_file(filename: str) -> bool:
         return True
     # check for temp table files according to https://www.postgresql.org/docs/current/storage-file-layout.html
     # i e "tBBB_FFF"
-    if not filename.startswith("t"):
-        return False
-
-    tmp_name = filename[1:].split("_")
-    if len(tmp_name) != 2:
-        return False
-
-    try:
-        list(map(int, tmp_name))
-    except:  # noqa: E722
-        return False
-    return True
+    return TEMP_TABLE_FILE_REGEX.fullmatch(filename) is not None
 
 
 #
 # Test helpers
 #
 def list_files_to_compare(pgdata_dir: Path) -> List[str]:
-    pgdata_files = []
+    """List the files in pgdata_dir to compare, relative to it, in no particular order."""
+    pgdata_files: List[str] = []
+    # Every root yielded by os.walk starts with pgdata_dir, so cut the prefix off
+    # instead of calling os.path.relpath, which calls getcwd() each time.
+    prefix_len = len(str(pgdata_dir)) + 1
     for root, _dirs, filenames in os.walk(pgdata_dir):
-        for filename in filenames:
-            rel_dir = os.path.relpath(root, pgdata_dir)
-            # Skip some dirs and files we don't want to compare
-            if should_skip_dir(rel_dir) or should_skip_file(filename):
-                continue
-            rel_file = os.path.join(rel_dir, filename)
-            pgdata_files.append(rel_file)
+        rel_dir = root[prefix_len:] or "."
+        # Skip some dirs and files we don't want to compare. A skipped dir only
+        # skips its own files: its subdirectories are still compared.
+        if should_skip_dir(rel_dir):
+            continue
+        pgdata_files.extend(
+            os.path.join(rel_dir, filename)
+            for filename in filenames
+            if not should_skip_file(filename)
+        )
 
-    pgdata_files.sort()
     log.info(pgdata_files)
     return pgdata_files
 
 
+CMP_BUFSIZE = 1024 * 1024
+
+
+def _files_equal(path1: str, path2: str) -> bool:
+    if os.stat(path1).st_size != os.stat(path2).st_size:
+        return False
+    with open(path1, "rb", buffering=0) as f1, open(path2, "rb", buffering=0) as f2:
+        while True:
+            b1 = f1.read(CMP_BUFSIZE)
+            b2 = f2.read(CMP_BUFSIZE)
+            if b1 != b2:
+                return False
+            if not b1:
+                return True
+
+
+def cmpfiles(
+    dir1: Union[str, Path], dir2: Union[str, Path], files: List[str]
+) -> Tuple[List[str], List[str], List[str]]:
+    """Same as filecmp.cmpfiles(shallow=False), but reads in bigger blocks."""
+    match: List[str] = []
+    mismatch: List[str] = []
+    error: List[str] = []
+
+    for f in files:
+        try:
+            equal = _files_equal(os.path.join(dir1, f), os.path.join(dir2, f))
+        except OSError:
+            error.append(f)
+            continue
+        (match if equal else mismatch).append(f)
+    return match, mismatch, error
+
+
+def cmpfiles_parallel(
+    dir1: Union[str, Path], dir2: Union[str, Path], files: List[str]
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Like cmpfiles(), but compares the files in several threads.
+    The comparison is I/O bound, so the GIL doesn't get in the way.
+    """
+    n_chunks = min(len(files), os.cpu_count() or 1)
+    if n_chunks <= 1:
+        return cmpfiles(dir1, dir2, files)
+
+    chunk_size = -(-len(files) // n_chunks)
+    chunks = [files[i : i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+    match: List[str] = []
+    mismatch: List[str] = []
+    error: List[str] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        for m, mm, e in executor.map(lambda chunk: cmpfiles(dir1, dir2, chunk), chunks):
+            match.extend(m)
+            mismatch.extend(mm)
+            error.extend(e)
+    return match, mismatch, error
+
+
 # pg is the existing and running compute node, that we want to compare with a basebackup
 def check_restored_datadir_content(test_output_dir: Path, env: NeonEnv, endpoint: Endpoint):
     # Get the timeline ID. We need it for the 'basebackup' command
@@ -4040,54 +4303,64 @@ def check_restored_datadir_content(test_output_dir: Path, env: NeonEnv, endpoint
     psql_path = os.path.join(pg_bin.pg_bin_path, "psql")
 
     pageserver_id = env.attachment_service.locate(endpoint.tenant_id)[0]["node_id"]
-    cmd = rf"""
-        {psql_path}                                    \
-            --no-psqlrc                                \
-            postgres://localhost:{env.get_pageserver(pageserver_id).service_port.pg}  \
-            -c 'basebackup {endpoint.tenant_id} {timeline_id}'  \
-         | tar -x -C {restored_dir_path}
-    """
+    psql_cmd = [
+        psql_path,
+        "--no-psqlrc",
+        f"postgres://localhost:{env.get_pageserver(pageserver_id).service_port.pg}",
+        "-c",
+        f"basebackup {endpoint.tenant_id} {timeline_id}",
+    ]
+    tar_cmd = ["tar", "-x", "-C", str(restored_dir_path)]
 
     # Set LD_LIBRARY_PATH in the env properly, otherwise we may use the wrong libpq.
     # PgBin sets it automatically, but here we need to pipe psql output to the tar command.
     psql_env = {"LD_LIBRARY_PATH": pg_bin.pg_lib_dir}
-    result = subprocess.run(cmd, env=psql_env, capture_output=True, text=True, shell=True)
-
-    # Print captured stdout/stderr if basebackup cmd failed.
-    if result.returncode != 0:
-        log.error("Basebackup shell command failed with:")
-        log.error(result.stdout)
-        log.error(result.stderr)
-    assert result.returncode == 0
+    with tempfile.TemporaryFile() as psql_stderr:
+        psql = subprocess.Popen(psql_cmd, env=psql_env, stdout=subprocess.PIPE, stderr=psql_stderr)
+        assert psql.stdout is not None
+        tar = subprocess.Popen(tar_cmd, stdin=psql.stdout, stderr=subprocess.PIPE)
+        # Drop our copy of the pipe so that psql gets SIGPIPE if tar exits early.
+        psql.stdout.close()
+        _, tar_stderr = tar.communicate()
+        psql.wait()
+
+        # Print captured stderr if basebackup failed.
+        if psql.returncode != 0 or tar.returncode != 0:
+            psql_stderr.seek(0)
+            log.error("Basebackup command failed with:")
+            log.error(f"psql exited with {psql.returncode}: {psql_stderr.read().decode()}")
+            log.error(f"tar exited with {tar.returncode}: {tar_stderr.decode()}")
+    assert psql.returncode == 0 and tar.returncode == 0
 
     # list files we're going to compare
     assert endpoint.pgdata_dir
-    pgdata_files = list_files_to_compare(Path(endpoint.pgdata_dir))
+    pgdata_dir = endpoint.pgdata_dir
+    pgdata_files = set(list_files_to_compare(Path(pgdata_dir)))
 
-    restored_files = list_files_to_compare(restored_dir_path)
+    restored_files = set(list_files_to_compare(restored_dir_path))
 
     if pgdata_files != restored_files:
         # filter pg_xact and multixact files which are downloaded on demand
-        pgdata_files = [
+        pgdata_files = {
             f
             for f in pgdata_files
             if not f.startswith("pg_xact") and not f.startswith("pg_multixact")
-        ]
+        }
 
     # check that file sets are equal
     assert pgdata_files == restored_files
 
     # compare content of the files
-    # filecmp returns (match, mismatch, error) lists
+    # cmpfiles returns (match, mismatch, error) lists
     # We've already filtered all mismatching files in list_files_to_compare(),
     # so here expect that the content is identical
-    (match, mismatch, error) = filecmp.cmpfiles(
-        endpoint.pgdata_dir, restored_dir_path, pgdata_files, shallow=False
+    (match, mismatch, error) = cmpfiles_parallel(
+        pgdata_dir, restored_dir_path, sorted(pgdata_files)
     )
     log.info(f"filecmp result mismatch and error lists:\n\t mismatch={mismatch}\n\t error={error}")
 
-    for f in mismatch:
-        f1 = os.path.join(endpoint.pgdata_dir, f)
+    def dump_diff(f: str):
+        f1 = os.path.join(pgdata_dir, f)
         f2 = os.path.join(restored_dir_path, f)
         stdout_filename = "{}.filediff".format(f2)
 
@@ -4098,9 +4371,29 @@ def check_restored_datadir_content(test_output_dir: Path, env: NeonEnv, endpoint
             cmd = "diff {}.hex {}.hex".format(f1, f2)
             subprocess.run([cmd], stdout=stdout_f, shell=True)
 
+    if mismatch:
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            list(executor.map(dump_diff, mismatch))
+
     assert (mismatch, error) == ([], [])
 
 
+def assert_table_larger_than_shared_buffers(cur: PgCursor, table: str):
+    """
+    Check that 'table' doesn't fit in shared_buffers, so that reading it back
+    after a pageserver restart has to go through the pageserver.
+    """
+    cur.execute(
+        "select setting::int * pg_size_bytes(unit), pg_relation_size(%s) "
+        "from pg_settings where name = 'shared_buffers'",
+        (table,),
+    )
+    row = cur.fetchone()
+    assert row is not None
+    log.info(f"shared_buffers is {row[0]}, table size {row[1]}")
+    assert int(row[0]) < int(row[1])
+
+
 def logical_replication_sync(subscriber: VanillaPostgres, publisher: Endpoint) -> Lsn:
     """Wait logical replication subscriber to sync with publisher."""
     publisher_lsn = Lsn(publisher.safe_psql("SELECT pg_current_wal_flush_lsn()")[0][0])
@@ -4149,6 +4442,24 @@ def tenant_get_shards(
         return [(TenantShardId(tenant_id, 0, 0), override_pageserver or env.pageserver)]
 
 
+ShardResult = TypeVar("ShardResult")
+
+
+def for_each_shard(
+    shards: list[tuple[TenantShardId, NeonPageserver]],
+    func: Callable[[TenantShardId, NeonPageserver], ShardResult],
+) -> list[ShardResult]:
+    """
+    Call `func` for every shard from `tenant_get_shards` concurrently, since the calls
+    are usually independent waits on different shards. Results are in `shards` order.
+    """
+    if len(shards) == 1:
+        return [func(*shards[0])]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(func, shard, pageserver) for shard, pageserver in shards]
+        return [f.result() for f in futures]
+
+
 def wait_replica_caughtup(primary: Endpoint, secondary: Endpoint):
     primary_lsn = Lsn(
         primary.safe_psql_scalar("SELECT pg_current_wal_flush_lsn()", log_query=False)
@@ -4177,8 +4488,7 @@ def wait_for_last_flush_lsn(
 
     last_flush_lsn = Lsn(endpoint.safe_psql("SELECT pg_current_wal_flush_lsn()")[0][0])
 
-    results = []
-    for tenant_shard_id, pageserver in shards:
+    def wait_shard(tenant_shard_id: TenantShardId, pageserver: NeonPageserver) -> Lsn:
         log.info(
             f"wait_for_last_flush_lsn: waiting for {last_flush_lsn} on shard {tenant_shard_id} on pageserver {pageserver.id})"
         )
@@ -4187,7 +4497,9 @@ def wait_for_last_flush_lsn(
         )
 
         assert waited >= last_flush_lsn
-        results.append(waited)
+        return waited
+
+    results = for_each_shard(shards, wait_shard)
 
     # Return the lowest LSN that has been ingested by all shards
     return min(results)
@@ -4202,16 +4514,13 @@ def wait_for_wal_insert_lsn(
 ) -> Lsn:
     """Wait for pageserver to catch up the latest flush LSN, returns the last observed lsn."""
     last_flush_lsn = Lsn(endpoint.safe_psql("SELECT pg_current_wal_insert_lsn()")[0][0])
-    result = None
-    for tenant_shard_id, pageserver in tenant_get_shards(env, tenant, pageserver_id):
-        shard_r = wait_for_last_record_lsn(
+    results = for_each_shard(
+        tenant_get_shards(env, tenant, pageserver_id),
+        lambda tenant_shard_id, pageserver: wait_for_last_record_lsn(
             pageserver.http_client(), tenant_shard_id, timeline, last_flush_lsn
-        )
-        if result is None:
-            result = shard_r
-
-    assert result is not None
-    return result
+        ),
+    )
+    return results[0]
 
 
 def fork_at_current_lsn(
@@ -4246,22 +4555,32 @@ def last_flush_lsn_upload(
         env, endpoint, tenant_id, timeline_id, pageserver_id=pageserver_id
     )
     shards = tenant_get_shards(env, tenant_id, pageserver_id)
-    for tenant_shard_id, pageserver in shards:
+
+    # Each shard's checkpoint and upload only depend on that shard, so run them
+    # side by side instead of waiting for one shard's upload before the next.
+    def checkpoint_and_upload(tenant_shard_id: TenantShardId, pageserver: NeonPageserver):
         ps_http = pageserver.http_client()
         wait_for_last_record_lsn(ps_http, tenant_shard_id, timeline_id, last_flush_lsn)
         # force a checkpoint to trigger upload
         ps_http.timeline_checkpoint(tenant_shard_id, timeline_id)
         wait_for_upload(ps_http, tenant_shard_id, timeline_id, last_flush_lsn)
+
+    for_each_shard(shards, checkpoint_and_upload)
     return last_flush_lsn
 
 
+GIT_VERSION_REGEX: re.Pattern = re.compile(  # type: ignore[type-arg]
+    r"git(-env)?:([0-9a-fA-F]{8,40})(-\S+)?"
+)
+
+
 def parse_project_git_version_output(s: str) -> str:
     """
     Parses the git commit hash out of the --version output supported at least by neon_local.
 
     The information is generated by utils::project_git_version!
     """
-    res = re.search(r"git(-env)?:([0-9a-fA-F]{8,40})(-\S+)?", s)
+    res = GIT_VERSION_REGEX.search(s)
     if res and (commit := res.group(2)):
         return commit
 
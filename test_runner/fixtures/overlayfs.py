@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import Iterator
 
@@ -9,8 +10,9 @@ def iter_mounts_beneath(topdir: Path) -> Iterator[Path]:
     Iterate over the overlayfs mounts beneath the specififed `topdir`.
     The `topdir` itself isn't considered.
     """
+    # A string prefix check is enough here (mountpoints are absolute and normalized),
+    # and avoids building `Path.parents` for every mount in the system.
+    prefix = os.path.join(os.fspath(topdir), "")
     for part in psutil.disk_partitions(all=True):
-        if part.fstype == "overlay":
-            mountpoint = Path(part.mountpoint)
-            if topdir in mountpoint.parents:
-                yield mountpoint
+        if part.fstype == "overlay" and part.mountpoint.startswith(prefix):
+            yield Path(part.mountpoint)
@@ -699,6 +699,12 @@ class PageserverHttpClient(requests.Session, MetricsGetter):
         res = self.get_metrics_str()
         return parse_metrics(res)
 
+    def get_metric_families(self, names: List[str]) -> Metrics:
+        """
+        Like get_metrics(), but only parses the samples with the given names.
+        """
+        return parse_metrics(self.get_metrics_str(), only=names)
+
     def get_timeline_metric(
         self, tenant_id: TenantId, timeline_id: TimelineId, metric_name: str
     ) -> float:
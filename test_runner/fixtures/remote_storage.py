@@ -1,3 +1,4 @@
+import concurrent.futures
 import enum
 import hashlib
 import json
@@ -10,6 +11,7 @@ from typing import Any, Dict, List, Optional, Union
 
 import boto3
 import toml
+from botocore.config import Config
 from mypy_boto3_s3 import S3Client
 
 from fixtures.log_helper import log
@@ -18,6 +20,16 @@ from fixtures.types import TenantId, TimelineId
 TIMELINE_INDEX_PART_FILE_NAME = "index_part.json"
 TENANT_HEATMAP_FILE_NAME = "heatmap-v1.json"
 
+# Shared by all S3 clients created here. The pool is larger than botocore's default of 10
+# so that S3Storage.do_cleanup's parallel deletes each get a kept-alive connection.
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={"max_attempts": 5, "mode": "standard"},
+)
+
+BUCKET_NAME_INVALID_CHARS_REGEX: re.Pattern = re.compile(r"[_\[\]]")  # type: ignore[type-arg]
+
 
 @enum.unique
 class RemoteStorageUser(str, enum.Enum):
@@ -90,21 +102,26 @@ class LocalFsStorage:
         return self.tenant_path(tenant_id) / "timelines" / str(timeline_id)
 
     def timeline_latest_generation(self, tenant_id, timeline_id):
-        timeline_files = os.listdir(self.timeline_path(tenant_id, timeline_id))
-        index_parts = [f for f in timeline_files if f.startswith("index_part")]
-
-        def parse_gen(filename):
-            log.info(f"parsing index_part '{filename}'")
-            parts = filename.split("-")
-            if len(parts) == 2:
-                return int(parts[1], 16)
-            else:
-                return None
-
-        generations = sorted([parse_gen(f) for f in index_parts])
-        if len(generations) == 0:
+        # Not cached: the pageserver uploads new index_parts behind our back, so the
+        # directory has to be listed every time. Only the maximum is needed though.
+        found = False
+        latest_gen = None
+        with os.scandir(self.timeline_path(tenant_id, timeline_id)) as it:
+            for entry in it:
+                filename = entry.name
+                if not filename.startswith("index_part"):
+                    continue
+                found = True
+                _, sep, gen_hex = filename.partition("-")
+                if sep:
+                    # A generation-less index_part sorts before any generation.
+                    gen = int(gen_hex, 16)
+                    if latest_gen is None or gen > latest_gen:
+                        latest_gen = gen
+
+        if not found:
             raise RuntimeError(f"No index_part found for {tenant_id}/{timeline_id}")
-        return generations[-1]
+        return latest_gen
 
     def index_path(self, tenant_id: TenantId, timeline_id: TimelineId) -> Path:
         latest_gen = self.timeline_latest_generation(tenant_id, timeline_id)
@@ -131,15 +148,13 @@ class LocalFsStorage:
         return self.timeline_path(tenant_id, timeline_id) / filename
 
     def index_content(self, tenant_id: TenantId, timeline_id: TimelineId):
-        with self.index_path(tenant_id, timeline_id).open("r") as f:
-            return json.load(f)
+        return json.loads(self.index_path(tenant_id, timeline_id).read_bytes())
 
     def heatmap_path(self, tenant_id: TenantId) -> Path:
         return self.tenant_path(tenant_id) / TENANT_HEATMAP_FILE_NAME
 
     def heatmap_content(self, tenant_id):
-        with self.heatmap_path(tenant_id).open("r") as f:
-            return json.load(f)
+        return json.loads(self.heatmap_path(tenant_id).read_bytes())
 
     def to_toml_inline_table(self) -> str:
         rv = {
@@ -222,34 +237,44 @@ class S3Storage:
         pages = paginator.paginate(
             Bucket=self.bucket_name,
             Prefix=self.prefix_in_bucket,
+            PaginationConfig={"PageSize": 1000},
         )
 
-        # Using Any because DeleteTypeDef (from boto3-stubs) doesn't fit our case
-        objects_to_delete: Any = {"Objects": []}
-        cnt = 0
-        for item in pages.search("Contents"):
-            # weirdly when nothing is found it returns [None]
-            if item is None:
-                break
-
-            objects_to_delete["Objects"].append({"Key": item["Key"]})
-
-            # flush once aws limit reached
-            if len(objects_to_delete["Objects"]) >= 1000:
-                self.client.delete_objects(
-                    Bucket=self.bucket_name,
-                    Delete=objects_to_delete,
-                )
-                objects_to_delete = {"Objects": []}
-                cnt += 1
-
-        # flush rest
-        if len(objects_to_delete["Objects"]):
+        def delete_batch(keys: List[Dict[str, str]]):
+            # Using Any because DeleteTypeDef (from boto3-stubs) doesn't fit our case
+            objects_to_delete: Any = {"Objects": keys, "Quiet": True}
             self.client.delete_objects(
                 Bucket=self.bucket_name,
                 Delete=objects_to_delete,
             )
 
+        # Deletes of different batches are independent, so don't wait for one
+        # to finish before sending the next. boto3 clients are thread-safe.
+        cnt = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            futures = []
+            keys: List[Dict[str, str]] = []
+            # Only the key of each object is needed, let JMESPath pick it out.
+            for key in pages.search("Contents[].Key"):
+                # weirdly when nothing is found it returns [None]
+                if key is None:
+                    break
+
+                keys.append({"Key": key})
+                cnt += 1
+
+                # flush once aws limit reached
+                if len(keys) >= 1000:
+                    futures.append(executor.submit(delete_batch, keys))
+                    keys = []
+
+            # flush rest
+            if len(keys):
+                futures.append(executor.submit(delete_batch, keys))
+
+            for future in futures:
+                future.result()
+
         log.info(f"deleted {cnt} objects from remote storage")
 
 
@@ -278,7 +303,7 @@ class RemoteStorageKind(str, enum.Enum):
         # real_s3 uses this as part of prefix, mock_s3 uses this as part of
         # bucket name, giving all users unique buckets because we have to
         # create them
-        test_name = re.sub(r"[_\[\]]", "-", test_name)
+        test_name = BUCKET_NAME_INVALID_CHARS_REGEX.sub("-", test_name)
 
         def to_bucket_name(user: str, test_name: str) -> str:
             s = f"{user}-{test_name}"
@@ -304,6 +329,7 @@ class RemoteStorageKind(str, enum.Enum):
                 region_name=mock_region,
                 aws_access_key_id=access_key,
                 aws_secret_access_key=secret_key,
+                config=S3_CLIENT_CONFIG,
             )
 
             bucket_name = to_bucket_name(user, test_name)
@@ -343,6 +369,7 @@ class RemoteStorageKind(str, enum.Enum):
         client = boto3.client(
             "s3",
             region_name=bucket_region,
+            config=S3_CLIENT_CONFIG,
         )
 
         return S3Storage(
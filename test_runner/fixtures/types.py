@@ -1,30 +1,42 @@
 import random
 from dataclasses import dataclass
-from functools import total_ordering
-from typing import Any, Type, TypeVar, Union
+from typing import Any, Optional, Type, TypeVar, Union
 
 T = TypeVar("T", bound="Id")
 
 
-@total_ordering
 class Lsn:
     """
     Datatype for an LSN. Internally it is a 64-bit integer, but the string
     representation is like "1/123abcd". See also pg_lsn datatype in Postgres
     """
 
+    __slots__ = ("lsn_int", "_str")
+
     def __init__(self, x: Union[int, str]):
         if isinstance(x, int):
             self.lsn_int = x
         else:
             """Convert lsn from hex notation to int."""
-            left, right = x.split("/")
-            self.lsn_int = (int(left, 16) << 32) + int(right, 16)
+            slash = x.index("/")
+            self.lsn_int = (int(x[:slash], 16) << 32) + int(x[slash + 1 :], 16)
         assert 0 <= self.lsn_int <= 0xFFFFFFFF_FFFFFFFF
+        self._str: Optional[str] = None
+
+    @classmethod
+    def _from_int(cls, lsn_int: int) -> "Lsn":
+        """Construct from an int without going through the str parsing branch of __init__."""
+        assert 0 <= lsn_int <= 0xFFFFFFFF_FFFFFFFF
+        lsn = object.__new__(cls)
+        lsn.lsn_int = lsn_int
+        lsn._str = None
+        return lsn
 
     def __str__(self) -> str:
         """Convert lsn from int to standard hex notation."""
-        return f"{(self.lsn_int >> 32):X}/{(self.lsn_int & 0xFFFFFFFF):X}"
+        if self._str is None:
+            self._str = "%X/%X" % (self.lsn_int >> 32, self.lsn_int & 0xFFFFFFFF)
+        return self._str
 
     def __repr__(self) -> str:
         return f'Lsn("{str(self)}")'
@@ -32,21 +44,38 @@ class Lsn:
     def __int__(self) -> int:
         return self.lsn_int
 
+    # All comparisons are spelled out rather than derived with @total_ordering,
+    # whose generated methods cost an extra Python-level call each.
     def __lt__(self, other: Any) -> bool:
         if not isinstance(other, Lsn):
             return NotImplemented
         return self.lsn_int < other.lsn_int
 
+    def __le__(self, other: Any) -> bool:
+        if not isinstance(other, Lsn):
+            return NotImplemented
+        return self.lsn_int <= other.lsn_int
+
     def __gt__(self, other: Any) -> bool:
         if not isinstance(other, Lsn):
-            raise NotImplementedError
+            return NotImplemented
         return self.lsn_int > other.lsn_int
 
+    def __ge__(self, other: Any) -> bool:
+        if not isinstance(other, Lsn):
+            return NotImplemented
+        return self.lsn_int >= other.lsn_int
+
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, Lsn):
             return NotImplemented
         return self.lsn_int == other.lsn_int
 
+    def __ne__(self, other: Any) -> bool:
+        if not isinstance(other, Lsn):
+            return NotImplemented
+        return self.lsn_int != other.lsn_int
+
     # Returns the difference between two Lsns, in bytes
     def __sub__(self, other: Any) -> int:
         if not isinstance(other, Lsn):
@@ -55,9 +84,9 @@ class Lsn:
 
     def __add__(self, other: Union[int, "Lsn"]) -> "Lsn":
         if isinstance(other, int):
-            return Lsn(self.lsn_int + other)
+            return Lsn._from_int(self.lsn_int + other)
         elif isinstance(other, Lsn):
-            return Lsn(self.lsn_int + other.lsn_int)
+            return Lsn._from_int(self.lsn_int + other.lsn_int)
         else:
             raise NotImplementedError
 
@@ -80,7 +109,6 @@ KEY_MAX = Key(0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF)
 KEY_MIN = Key(0)
 
 
-@total_ordering
 class Id:
     """
     Datatype for a Neon tenant and timeline IDs. Internally it's a 16-byte array, and
@@ -88,43 +116,81 @@ class Id:
     TimelineIds in the Rust code.
     """
 
+    # IDs are used as dict keys all over the tests: keep the bytes immutable so they can
+    # be hashed directly, and remember the hex form instead of re-encoding it each time.
+    __slots__ = ("id", "_hex")
+
     def __init__(self, x: str):
-        self.id = bytearray.fromhex(x)
+        self.id = bytes.fromhex(x)
         assert len(self.id) == 16
+        self._hex = self.id.hex()
 
     def __str__(self) -> str:
-        return self.id.hex()
+        return self._hex
 
     def __lt__(self, other) -> bool:
         if not isinstance(other, type(self)):
             return NotImplemented
         return self.id < other.id
 
+    def __le__(self, other) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return self.id <= other.id
+
+    def __gt__(self, other) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return self.id > other.id
+
+    def __ge__(self, other) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return self.id >= other.id
+
     def __eq__(self, other) -> bool:
         if not isinstance(other, type(self)):
             return NotImplemented
         return self.id == other.id
 
+    def __ne__(self, other) -> bool:
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return self.id != other.id
+
     def __hash__(self) -> int:
-        return hash(str(self.id))
+        return hash(self.id)
+
+    @classmethod
+    def _from_bytes(cls: Type[T], b: bytes) -> T:
+        """Construct from raw bytes, skipping the hex parsing in __init__."""
+        assert len(b) == 16
+        new = object.__new__(cls)
+        new.id = b
+        new._hex = b.hex()
+        return new
 
     @classmethod
     def generate(cls: Type[T]) -> T:
         """Generate a random ID"""
-        return cls(random.randbytes(16).hex())
+        return cls._from_bytes(random.randbytes(16))
 
 
 class TenantId(Id):
+    __slots__ = ()
+
     def __repr__(self) -> str:
-        return f'`TenantId("{self.id.hex()}")'
+        return f'`TenantId("{self._hex}")'
 
     def __str__(self) -> str:
-        return self.id.hex()
+        return self._hex
 
 
 class TimelineId(Id):
+    __slots__ = ()
+
     def __repr__(self) -> str:
-        return f'TimelineId("{self.id.hex()}")'
+        return f'TimelineId("{self._hex}")'
 
 
 # Workaround for compat with python 3.9, which does not have `typing.Self`
@@ -132,11 +198,17 @@ TTenantShardId = TypeVar("TTenantShardId", bound="TenantShardId")
 
 
 class TenantShardId:
+    # Treated as immutable: the comparison tuple, hash and string form are computed once.
+    __slots__ = ("tenant_id", "shard_number", "shard_count", "_tuple_cache", "_hash", "_str")
+
     def __init__(self, tenant_id: TenantId, shard_number: int, shard_count: int):
         self.tenant_id = tenant_id
         self.shard_number = shard_number
         self.shard_count = shard_count
         assert self.shard_number < self.shard_count or self.shard_count == 0
+        self._tuple_cache = (tenant_id, shard_number, shard_count)
+        self._hash = hash(self._tuple_cache)
+        self._str = f"{tenant_id}-{shard_number:02x}{shard_count:02x}"
 
     @classmethod
     def parse(cls: Type[TTenantShardId], input) -> TTenantShardId:
@@ -156,10 +228,10 @@ class TenantShardId:
             raise ValueError(f"Invalid TenantShardId '{input}'")
 
     def __str__(self):
-        return f"{self.tenant_id}-{self.shard_number:02x}{self.shard_count:02x}"
+        return self._str
 
     def _tuple(self) -> tuple[TenantId, int, int]:
-        return (self.tenant_id, self.shard_number, self.shard_count)
+        return self._tuple_cache
 
     def __lt__(self, other) -> bool:
         if not isinstance(other, type(self)):
@@ -172,4 +244,4 @@ class TenantShardId:
         return self._tuple() == other._tuple()
 
     def __hash__(self) -> int:
-        return hash(self._tuple())
+        return self._hash
@@ -387,6 +387,31 @@ def wait_until(number_of_iterations: int, interval: float, func: Fn):
     raise Exception("timed out while waiting for %s" % func) from last_exception
 
 
+def wait_until_backoff(max_seconds: float, func: Fn, max_interval: float = 1.0):
+    """
+    Like wait_until, but polls with an exponentially growing interval, starting
+    at 50ms and capped at 'max_interval', until 'max_seconds' have passed. Use
+    it for conditions that usually become true quickly.
+    """
+    deadline = time.monotonic() + max_seconds
+    interval = 0.05
+    last_exception = None
+    i = 0
+    while True:
+        i += 1
+        try:
+            return func()
+        except Exception as e:
+            log.info("waiting for %s iteration %s failed", func, i)
+            last_exception = e
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, max_interval)
+    raise Exception("timed out while waiting for %s" % func) from last_exception
+
+
 def run_pg_bench_small(pg_bin: "PgBin", connstr: str):
     """
     Fast way to populate data.
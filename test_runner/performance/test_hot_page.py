@@ -22,12 +22,24 @@ def test_hot_page(env: PgCompare):
         with conn.cursor() as cur:
             cur.execute("drop table if exists t, f;")
 
-            # Write many updates to the same row
+            # Write many updates to the same row. Each update is its own transaction, as
+            # before, but the loop runs server-side to keep client round-trips out of it.
             with env.record_duration("write"):
                 cur.execute("create table t (i integer);")
                 cur.execute("insert into t values (0);")
-                for i in range(num_writes):
-                    cur.execute(f"update t set i = {i};")
+                cur.execute("SET statement_timeout=0")
+                cur.execute(
+                    f"""
+                    DO $$
+                    BEGIN
+                        FOR n IN 0..{num_writes - 1} LOOP
+                            UPDATE t SET i = n;
+                            COMMIT;
+                        END LOOP;
+                    END
+                    $$
+                    """
+                )
 
             # Write 3-4 MB to evict t from compute cache
             cur.execute("create table f (i integer);")
@@ -1,3 +1,4 @@
+import concurrent.futures
 import random
 import threading
 import time
@@ -59,44 +60,32 @@ def test_branching_with_pgbench(
     endpoints: List[Endpoint] = []
     endpoints.append(env.endpoints.create_start("b0", tenant_id=tenant))
 
-    threads: List[threading.Thread] = []
-    threads.append(
-        threading.Thread(target=run_pgbench, args=(endpoints[0].connstr(),), daemon=True)
-    )
-    threads[-1].start()
-
+    # Limit the number of concurrent pgbench runs: the regression tests in this
+    # directory are run concurrently in CI, and we want to avoid the situation that
+    # one test exhausts resources for other tests. The pool starts a queued run as
+    # soon as any running one finishes, rather than waiting for all of them.
     thread_limit = 4
 
-    for i in range(n_branches):
-        # random a delay between [0, 5]
-        delay = random.random() * 5
-        time.sleep(delay)
-        log.info(f"Sleep {delay}s")
-
-        # If the number of concurrent threads exceeds a threshold, wait for
-        # all the threads to finish before spawning a new one. Because the
-        # regression tests in this directory are run concurrently in CI, we
-        # want to avoid the situation that one test exhausts resources for
-        # other tests.
-        if len(threads) >= thread_limit:
-            for thread in threads:
-                thread.join()
-            threads = []
-
-        if ty == "cascade":
-            env.neon_cli.create_branch("b{}".format(i + 1), "b{}".format(i), tenant_id=tenant)
-        else:
-            env.neon_cli.create_branch("b{}".format(i + 1), "b0", tenant_id=tenant)
-
-        endpoints.append(env.endpoints.create_start("b{}".format(i + 1), tenant_id=tenant))
-
-        threads.append(
-            threading.Thread(target=run_pgbench, args=(endpoints[-1].connstr(),), daemon=True)
-        )
-        threads[-1].start()
-
-    for thread in threads:
-        thread.join()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=thread_limit) as executor:
+        futures = [executor.submit(run_pgbench, endpoints[0].connstr())]
+
+        for i in range(n_branches):
+            # random a delay between [0, 5]
+            delay = random.random() * 5
+            time.sleep(delay)
+            log.info(f"Sleep {delay}s")
+
+            if ty == "cascade":
+                env.neon_cli.create_branch("b{}".format(i + 1), "b{}".format(i), tenant_id=tenant)
+            else:
+                env.neon_cli.create_branch("b{}".format(i + 1), "b0", tenant_id=tenant)
+
+            endpoints.append(env.endpoints.create_start("b{}".format(i + 1), tenant_id=tenant))
+
+            futures.append(executor.submit(run_pgbench, endpoints[-1].connstr()))
+
+        for future in futures:
+            future.result()
 
     for ep in endpoints:
         res = ep.safe_psql("SELECT count(*) from pgbench_accounts")
@@ -348,11 +337,4 @@ def test_non_uploaded_branch_is_deleted_after_restart(neon_env_builder: NeonEnvB
 
 
 def wait_until_paused(env: NeonEnv, failpoint: str):
-    found = False
-    msg = f"at failpoint {failpoint}"
-    for _ in range(20):
-        time.sleep(1)
-        found = env.pageserver.log_contains(msg) is not None
-        if found:
-            break
-    assert found
+    env.pageserver.wait_for_log_line(f"at failpoint {failpoint}", timeout=20)
@@ -1,9 +1,8 @@
 import os
-import time
 
 from fixtures.log_helper import log
 from fixtures.neon_fixtures import NeonEnv
-from fixtures.utils import query_scalar
+from fixtures.utils import query_scalar, wait_until
 
 
 #
@@ -31,29 +30,32 @@ def test_clog_truncate(neon_simple_env: NeonEnv):
 
     # Consume many xids to advance clog
     with endpoint.cursor() as cur:
-        cur.execute("select test_consume_xids(1000*1000*10);")
+        # In chunks, each in its own transaction, so autovacuum can start freezing and
+        # truncating while the later chunks are still being consumed.
+        for _ in range(10):
+            cur.execute("select test_consume_xids(1000*1000);")
         log.info("xids consumed")
 
-        # call a checkpoint to trigger TruncateSubtrans
-        cur.execute("CHECKPOINT;")
-
-        # ensure WAL flush
-        cur.execute("select txid_current()")
+        # call a checkpoint to trigger TruncateSubtrans, and
+        # ensure WAL flush, in one round-trip
+        cur.execute("CHECKPOINT; select txid_current()")
         log.info(cur.fetchone())
 
     # wait for autovacuum to truncate the pg_xact
-    # XXX Is it worth to add a timeout here?
     pg_xact_0000_path = os.path.join(endpoint.pg_xact_dir_path(), "0000")
     log.info(f"pg_xact_0000_path = {pg_xact_0000_path}")
 
-    while os.path.isfile(pg_xact_0000_path):
-        log.info(f"file exists. wait for truncation: {pg_xact_0000_path=}")
-        time.sleep(5)
+    def assert_truncated():
+        assert not os.path.isfile(
+            pg_xact_0000_path
+        ), f"file exists. wait for truncation: {pg_xact_0000_path=}"
+
+    # Poll often: the file usually goes away well before a coarse 5s sleep would notice.
+    wait_until(400, 0.5, assert_truncated)
 
     # checkpoint to advance latest lsn
     with endpoint.cursor() as cur:
-        cur.execute("CHECKPOINT;")
-        lsn_after_truncation = query_scalar(cur, "select pg_current_wal_insert_lsn()")
+        lsn_after_truncation = query_scalar(cur, "CHECKPOINT; select pg_current_wal_insert_lsn()")
 
     # create new branch after clog truncation and start a compute node on it
     log.info(f"create branch at lsn_after_truncation {lsn_after_truncation}")
@@ -14,9 +14,8 @@ def test_createuser(neon_simple_env: NeonEnv):
         # Cause a 'relmapper' change in the original branch
         cur.execute("CREATE USER testuser with password %s", ("testpwd",))
 
-        cur.execute("CHECKPOINT")
-
-        lsn = query_scalar(cur, "SELECT pg_current_wal_insert_lsn()")
+        # Kept apart from CREATE USER, which must commit before the checkpoint.
+        lsn = query_scalar(cur, "CHECKPOINT; SELECT pg_current_wal_insert_lsn()")
 
     # Create a branch
     env.neon_cli.create_branch("test_createuser2", "test_createuser", ancestor_start_lsn=lsn)
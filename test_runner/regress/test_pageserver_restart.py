@@ -1,12 +1,75 @@
+import functools
+import io
 import random
 from contextlib import closing
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
+import psycopg2
 import pytest
 from fixtures.log_helper import log
-from fixtures.neon_fixtures import NeonEnvBuilder
+from fixtures.neon_fixtures import NeonEnvBuilder, assert_table_larger_than_shared_buffers
 from fixtures.remote_storage import s3_storage
-from fixtures.utils import wait_until
+from fixtures.utils import wait_until_backoff
+
+# How long test_pageserver_restart delays the loading of tenants on startup
+TENANT_LOAD_DELAY_MS = 5000
+
+# Expectations for the pageserver_startup_duration_seconds phases, in order.
+# Callbacks: arg t is sample value, arg p is the previous phase's sample value
+STARTUP_PHASE_EXPECTATIONS = {
+    # make no assumptions about the initial time point, it could be 0 in theory
+    "initial": lambda t, p: True,
+    # Remote phase of initial_tenant_load should happen before overall phase is complete
+    "initial_tenant_load_remote": lambda t, p: t >= 0.0 and t >= p,
+    # Initial tenant load should reflect the delay we injected
+    "initial_tenant_load": lambda t, p: t >= (TENANT_LOAD_DELAY_MS / 1000.0) and t >= p,
+    # Subsequent steps should occur in expected order
+    "background_jobs_can_start": lambda t, p: t > 0 and t >= p,
+    "complete": lambda t, p: t > 0 and t >= p,
+}
+
+# The metrics test_pageserver_restart checks once startup is complete
+STARTUP_METRICS = [
+    "pageserver_startup_duration_seconds",
+    "pageserver_startup_is_loading",
+    "pageserver_tenant_activation_seconds_bucket",
+]
+
+
+@functools.lru_cache(maxsize=None)
+def foo_copy_payload(with_updates: bool) -> str:
+    """
+    COPY input for create_foo(). It is the same for every test in this module,
+    so build it once per process.
+    """
+    if with_updates:
+        rows = (f"{g}\tlong string to consume some space{g}\t0\n" for g in range(1, 100001))
+    else:
+        rows = (f"long string to consume some space{g}\n" for g in range(1, 100001))
+    return "".join(rows)
+
+
+def create_foo(cur, with_updates: bool):
+    """
+    Create table foo with 100000 rows. Make it big enough that it doesn't fit in
+    shared_buffers, otherwise the SELECT after restart will just return answer
+    from shared_buffers without hitting the page server, which defeats the point
+    of these tests.
+
+    With 'with_updates', the table also gets an indexed id column and an
+    'updates' counter column starting at 0.
+    """
+    if with_updates:
+        cur.execute("CREATE TABLE foo (id int, t text, updates int)")
+        cur.execute("CREATE INDEX ON foo (id)")
+        columns: Tuple[str, ...] = ("id", "t", "updates")
+    else:
+        cur.execute("CREATE TABLE foo (t text)")
+        columns = ("t",)
+    cur.copy_from(io.StringIO(foo_copy_payload(with_updates)), "foo", columns=columns)
+
+    # Verify that the table is larger than shared_buffers
+    assert_table_larger_than_shared_buffers(cur, "foo")
 
 
 # Test restarting page server, while safekeeper and compute node keep
@@ -25,30 +88,7 @@ def test_pageserver_restart(neon_env_builder: NeonEnvBuilder):
     pg_conn = endpoint.connect()
     cur = pg_conn.cursor()
 
-    # Create table, and insert some rows. Make it big enough that it doesn't fit in
-    # shared_buffers, otherwise the SELECT after restart will just return answer
-    # from shared_buffers without hitting the page server, which defeats the point
-    # of this test.
-    cur.execute("CREATE TABLE foo (t text)")
-    cur.execute(
-        """
-        INSERT INTO foo
-            SELECT 'long string to consume some space' || g
-            FROM generate_series(1, 100000) g
-    """
-    )
-
-    # Verify that the table is larger than shared_buffers
-    cur.execute(
-        """
-        select setting::int * pg_size_bytes(unit) as shared_buffers, pg_relation_size('foo') as tbl_size
-        from pg_settings where name = 'shared_buffers'
-    """
-    )
-    row = cur.fetchone()
-    assert row is not None
-    log.info(f"shared_buffers is {row[0]}, table size {row[1]}")
-    assert int(row[0]) < int(row[1])
+    create_foo(cur, with_updates=False)
 
     # Stop the pageserver gracefully and restart it.
     env.pageserver.stop()
@@ -64,15 +104,13 @@ def test_pageserver_restart(neon_env_builder: NeonEnvBuilder):
     # pageserver does if a compute node connects and sends a request for the tenant
     # while it's still in Loading state. (It waits for the loading to finish, and then
     # processes the request.)
-    tenant_load_delay_ms = 5000
     env.pageserver.stop()
     env.pageserver.start(
-        extra_env_vars={"FAILPOINTS": f"before-attaching-tenant=return({tenant_load_delay_ms})"}
+        extra_env_vars={"FAILPOINTS": f"before-attaching-tenant=return({TENANT_LOAD_DELAY_MS})"}
     )
 
     # Check that it's in Attaching state
-    client = env.pageserver.http_client()
-    tenant_status = client.tenant_status(env.initial_tenant)
+    tenant_status = pageserver_http.tenant_status(env.initial_tenant)
     log.info("Tenant status : %s", tenant_status)
     assert tenant_status["state"]["slug"] == "Attaching"
 
@@ -82,46 +120,37 @@ def test_pageserver_restart(neon_env_builder: NeonEnvBuilder):
 
     # Wait for metrics to indicate startup complete, so that we can know all
     # startup phases will be reflected in the subsequent checks
+    # startup phase -> last logged value, so polling only logs changes
+    logged_phases: Dict[str, float] = {}
+
     def assert_complete():
-        for sample in pageserver_http.get_metrics().query_all(
-            "pageserver_startup_duration_seconds"
-        ):
-            labels = dict(sample.labels)
-            log.info(f"metric {labels['phase']}={sample.value}")
-            if labels["phase"] == "complete" and sample.value > 0:
-                return
+        metrics = pageserver_http.get_metric_families(STARTUP_METRICS)
+        for sample in metrics.query_all("pageserver_startup_duration_seconds"):
+            phase = sample.labels["phase"]
+            if logged_phases.get(phase) != sample.value:
+                log.info("metric %s=%s", phase, sample.value)
+                logged_phases[phase] = sample.value
+            if phase == "complete" and sample.value > 0:
+                return metrics
 
         raise AssertionError("No 'complete' metric yet")
 
-    wait_until(30, 1.0, assert_complete)
-
-    # Expectation callbacks: arg t is sample value, arg p is the previous phase's sample value
-    expectations = [
-        (
-            "initial",
-            lambda t, p: True,
-        ),  # make no assumptions about the initial time point, it could be 0 in theory
-        # Remote phase of initial_tenant_load should happen before overall phase is complete
-        ("initial_tenant_load_remote", lambda t, p: t >= 0.0 and t >= p),
-        # Initial tenant load should reflect the delay we injected
-        ("initial_tenant_load", lambda t, p: t >= (tenant_load_delay_ms / 1000.0) and t >= p),
-        # Subsequent steps should occur in expected order
-        ("background_jobs_can_start", lambda t, p: t > 0 and t >= p),
-        ("complete", lambda t, p: t > 0 and t >= p),
-    ]
+    # Startup is complete once we get here, so the metrics checked below won't change
+    # anymore: reuse the scrape that observed it.
+    metrics = wait_until_backoff(30, assert_complete)
 
     # Accumulate the runtime of each startup phase
-    values = {}
-    metrics = pageserver_http.get_metrics()
-    prev_value = None
-    for sample in metrics.query_all("pageserver_startup_duration_seconds"):
-        phase = sample.labels["phase"]
-        log.info(f"metric {phase}={sample.value}")
-        assert phase in [e[0] for e in expectations], f"Unexpected phase {phase}"
-        values[phase] = sample
+    values = {
+        sample.labels["phase"]: sample
+        for sample in metrics.query_all("pageserver_startup_duration_seconds")
+    }
+    log.info("startup phases: %s", {phase: sample.value for phase, sample in values.items()})
+    unexpected = values.keys() - STARTUP_PHASE_EXPECTATIONS.keys()
+    assert not unexpected, f"Unexpected phases {unexpected}"
 
     # Apply expectations to the metrics retrieved
-    for phase, expectation in expectations:
+    prev_value = None
+    for phase, expectation in STARTUP_PHASE_EXPECTATIONS.items():
         assert phase in values, f"No data for phase {phase}"
         sample = values[phase]
         assert expectation(
@@ -172,48 +201,44 @@ def test_pageserver_chaos(
     env.neon_cli.create_timeline("test_pageserver_chaos", tenant_id=tenant)
     endpoint = env.endpoints.create_start("test_pageserver_chaos", tenant_id=tenant)
 
-    # Create table, and insert some rows. Make it big enough that it doesn't fit in
-    # shared_buffers, otherwise the SELECT after restart will just return answer
-    # from shared_buffers without hitting the page server, which defeats the point
-    # of this test.
     with closing(endpoint.connect()) as conn:
         with conn.cursor() as cur:
-            cur.execute("CREATE TABLE foo (id int, t text, updates int)")
-            cur.execute("CREATE INDEX ON foo (id)")
-            cur.execute(
-                """
-            INSERT INTO foo
-            SELECT g, 'long string to consume some space' || g, 0
-            FROM generate_series(1, 100000) g
-            """
-            )
-
-            # Verify that the table is larger than shared_buffers
-            cur.execute(
-                """
-            select setting::int * pg_size_bytes(unit) as shared_buffers, pg_relation_size('foo') as tbl_size
-            from pg_settings where name = 'shared_buffers'
-            """
-            )
-            row = cur.fetchone()
-            assert row is not None
-            log.info(f"shared_buffers is {row[0]}, table size {row[1]}")
-            assert int(row[0]) < int(row[1])
+            create_foo(cur, with_updates=True)
 
     # We run "random" kills using a fixed seed, to improve reproducibility if a test
     # failure is related to a particular order of operations.
+    # The whole kill sequence is drawn up front and logged, so that a failing run
+    # shows which pageservers are going to be killed.
     seed = 0xDEADBEEF
     rng = random.Random(seed)
-
-    # Update the whole table, then immediately kill and restart the pageserver
-    for i in range(1, 15):
-        endpoint.safe_psql("UPDATE foo set updates = updates + 1")
-
-        # This kills the pageserver immediately, to simulate a crash
-        to_kill = rng.choice(env.pageservers)
-        to_kill.stop(immediate=True)
-        to_kill.start()
-
-        # Check that all the updates are visible
-        num_updates = endpoint.safe_psql("SELECT sum(updates) FROM foo")[0][0]
-        assert num_updates == i * 100000
+    kill_seq = [rng.randrange(len(env.pageservers)) for _ in range(1, 15)]
+    log.info("kill sequence (pageserver indexes): %s", kill_seq)
+
+    # Update the whole table, then immediately kill and restart the pageserver.
+    # The compute keeps running across pageserver restarts, so reuse one connection,
+    # and only reconnect if the compute dropped it. The UPDATE is not retried, as
+    # it may have been applied already.
+    conn = endpoint.connect()
+    try:
+        for i in range(1, 15):
+            conn.cursor().execute("UPDATE foo set updates = updates + 1")
+
+            # This kills the pageserver immediately, to simulate a crash
+            to_kill = env.pageservers[kill_seq[i - 1]]
+            to_kill.stop(immediate=True)
+            to_kill.start()
+
+            # Check that all the updates are visible
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT sum(updates) FROM foo")
+            except psycopg2.OperationalError:
+                log.info("connection to compute lost, reconnecting")
+                conn.close()
+                conn = endpoint.connect()
+                cur = conn.cursor()
+                cur.execute("SELECT sum(updates) FROM foo")
+            num_updates = cur.fetchone()[0]
+            assert num_updates == i * 100000
+    finally:
+        conn.close()
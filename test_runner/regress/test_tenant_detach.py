@@ -1,8 +1,8 @@
 import asyncio
+import concurrent.futures
 import enum
+import io
 import random
-import time
-from threading import Thread
 from typing import List, Optional
 
 import asyncpg
@@ -51,6 +51,15 @@ def do_gc_target(
         log.info("gc http thread returning")
 
 
+def seed_rows(cur, num_rows: int = 100000):
+    """Fill table t(key, value) with num_rows 'payload' rows using COPY."""
+    cur.copy_from(
+        io.StringIO("".join(f"{key}\tpayload\n" for key in range(1, num_rows + 1))),
+        "t",
+        columns=("key", "value"),
+    )
+
+
 class ReattachMode(str, enum.Enum):
     REATTACH_EXPLICIT = "explicit"
     REATTACH_RESET = "reset"
@@ -83,7 +92,7 @@ def test_tenant_reattach(neon_env_builder: NeonEnvBuilder, mode: str):
     with env.endpoints.create_start("main", tenant_id=tenant_id) as endpoint:
         with endpoint.cursor() as cur:
             cur.execute("CREATE TABLE t(key int primary key, value text)")
-            cur.execute("INSERT INTO t SELECT generate_series(1,100000), 'payload'")
+            seed_rows(cur)
             current_lsn = Lsn(query_scalar(cur, "SELECT pg_current_wal_flush_lsn()"))
 
     # Wait for the all data to be processed by the pageserver and uploaded in remote storage
@@ -92,14 +101,15 @@ def test_tenant_reattach(neon_env_builder: NeonEnvBuilder, mode: str):
     wait_for_upload(pageserver_http, tenant_id, timeline_id, current_lsn)
 
     # Check that we had to retry the uploads
-    assert env.pageserver.log_contains(
-        ".*failed to perform remote task UploadLayer.*, will retry.*"
-    )
-    assert env.pageserver.log_contains(
-        ".*failed to perform remote task UploadMetadata.*, will retry.*"
+    found = env.pageserver.log_contains_all(
+        [
+            ".*failed to perform remote task UploadLayer.*, will retry.*",
+            ".*failed to perform remote task UploadMetadata.*, will retry.*",
+        ]
     )
+    assert all(found.values()), f"missing upload retries in log: {found}"
 
-    ps_metrics = pageserver_http.get_metrics()
+    ps_metrics = pageserver_http.get_metric_families(["pageserver_last_record_lsn"])
     tenant_metric_filter = {
         "tenant_id": str(tenant_id),
         "timeline_id": str(timeline_id),
@@ -118,22 +128,28 @@ def test_tenant_reattach(neon_env_builder: NeonEnvBuilder, mode: str):
     else:
         raise NotImplementedError(mode)
 
-    time.sleep(1)  # for metrics propagation
-
-    ps_metrics = pageserver_http.get_metrics()
-    pageserver_last_record_lsn = int(
-        ps_metrics.query_one("pageserver_last_record_lsn", filter=tenant_metric_filter).value
-    )
+    # Wait for the metrics of the re-attached timeline to show up
+    def last_record_lsn_restored():
+        ps_metrics = pageserver_http.get_metric_families(["pageserver_last_record_lsn"])
+        pageserver_last_record_lsn = int(
+            ps_metrics.query_one("pageserver_last_record_lsn", filter=tenant_metric_filter).value
+        )
+        assert pageserver_last_record_lsn_before_detach == pageserver_last_record_lsn
 
-    assert pageserver_last_record_lsn_before_detach == pageserver_last_record_lsn
+    wait_until(20, 0.1, last_record_lsn_restored)
 
     with env.endpoints.create_start("main", tenant_id=tenant_id) as endpoint:
         with endpoint.cursor() as cur:
             assert query_scalar(cur, "SELECT count(*) FROM t") == 100000
 
         # Check that we had to retry the downloads
-        assert env.pageserver.log_contains(".*list timelines.*failed, will retry.*")
-        assert env.pageserver.log_contains(".*download.*failed, will retry.*")
+        found = env.pageserver.log_contains_all(
+            [
+                ".*list timelines.*failed, will retry.*",
+                ".*download.*failed, will retry.*",
+            ]
+        )
+        assert all(found.values()), f"missing download retries in log: {found}"
 
 
 num_connections = 10
@@ -293,12 +309,9 @@ def test_tenant_detach_smoke(neon_env_builder: NeonEnvBuilder):
 
     endpoint = env.endpoints.create_start("main", tenant_id=tenant_id)
     # we rely upon autocommit after each statement
-    endpoint.safe_psql_many(
-        queries=[
-            "CREATE TABLE t(key int primary key, value text)",
-            "INSERT INTO t SELECT generate_series(1,100000), 'payload'",
-        ]
-    )
+    with endpoint.cursor() as cur:
+        cur.execute("CREATE TABLE t(key int primary key, value text)")
+        seed_rows(cur)
 
     # gc should not try to even start on a timeline that doesn't exist
     with pytest.raises(
@@ -321,19 +334,20 @@ def test_tenant_detach_smoke(neon_env_builder: NeonEnvBuilder):
     pageserver_http.configure_failpoints(
         ("gc_iteration_internal_after_getting_gc_timelines", "return(2000)")
     )
-    gc_thread = Thread(target=lambda: do_gc_target(pageserver_http, tenant_id, timeline_id))
-    gc_thread.start()
-    time.sleep(5)
-    # By now the gc task is spawned but in sleep for another second due to the failpoint.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        gc_future = executor.submit(do_gc_target, pageserver_http, tenant_id, timeline_id)
+        env.pageserver.wait_for_log_line(
+            'failpoint "gc_iteration_internal_after_getting_gc_timelines": sleeping', timeout=10
+        )
+        # By now the gc task is spawned and sleeping in the failpoint.
 
-    log.info("detaching tenant")
-    pageserver_http.tenant_detach(tenant_id)
-    log.info("tenant detached without error")
+        log.info("detaching tenant")
+        pageserver_http.tenant_detach(tenant_id)
+        log.info("tenant detached without error")
 
-    log.info("wait for gc thread to return")
-    gc_thread.join(timeout=10)
-    assert not gc_thread.is_alive()
-    log.info("gc thread returned")
+        log.info("wait for gc thread to return")
+        gc_future.result(timeout=10)
+        log.info("gc thread returned")
 
     # check that nothing is left on disk for deleted tenant
     assert not env.pageserver.tenant_dir(tenant_id).exists()
@@ -360,12 +374,9 @@ def test_tenant_detach_ignored_tenant(neon_simple_env: NeonEnv):
 
     endpoint = env.endpoints.create_start("main", tenant_id=tenant_id)
     # we rely upon autocommit after each statement
-    endpoint.safe_psql_many(
-        queries=[
-            "CREATE TABLE t(key int primary key, value text)",
-            "INSERT INTO t SELECT generate_series(1,100000), 'payload'",
-        ]
-    )
+    with endpoint.cursor() as cur:
+        cur.execute("CREATE TABLE t(key int primary key, value text)")
+        seed_rows(cur)
 
     # ignore tenant
     client.tenant_ignore(tenant_id)
@@ -410,12 +421,9 @@ def test_tenant_detach_regular_tenant(neon_simple_env: NeonEnv):
 
     endpoint = env.endpoints.create_start("main", tenant_id=tenant_id)
     # we rely upon autocommit after each statement
-    endpoint.safe_psql_many(
-        queries=[
-            "CREATE TABLE t(key int primary key, value text)",
-            "INSERT INTO t SELECT generate_series(1,100000), 'payload'",
-        ]
-    )
+    with endpoint.cursor() as cur:
+        cur.execute("CREATE TABLE t(key int primary key, value text)")
+        seed_rows(cur)
 
     log.info("detaching regular tenant with detach ignored flag")
     client.tenant_detach(tenant_id, True)
@@ -457,12 +465,12 @@ def test_detach_while_attaching(
     # of this test.
     with endpoint.cursor() as cur:
         cur.execute("CREATE TABLE foo (t text)")
-        cur.execute(
-            """
-            INSERT INTO foo
-            SELECT 'long string to consume some space' || g
-            FROM generate_series(1, 100000) g
-            """
+        cur.copy_from(
+            io.StringIO(
+                "".join(f"long string to consume some space{g}\n" for g in range(1, 100001))
+            ),
+            "foo",
+            columns=("t",),
         )
         current_lsn = Lsn(query_scalar(cur, "SELECT pg_current_wal_flush_lsn()"))
 
@@ -489,8 +497,15 @@ def test_detach_while_attaching(
     # Before it has chance to finish, detach it again
     pageserver_http.tenant_detach(tenant_id)
 
-    # is there a better way to assert that failpoint triggered?
-    time.sleep(10)
+    # Give the first attach a chance to get through its failpoint sleep, which the
+    # detach cancels. Don't fail if that isn't logged: the detach may also have
+    # stopped the attach before it got to the failpoint.
+    try:
+        env.pageserver.wait_for_log_line(
+            'failpoint "attach-before-activate-sleep": sleep done', timeout=10
+        )
+    except TimeoutError:
+        log.info("attach-before-activate-sleep failpoint was not hit")
 
     # Attach it again. If the GC and compaction loops from the previous attach/detach
     # cycle are still running, things could get really confusing..
@@ -749,6 +764,8 @@ def test_metrics_while_ignoring_broken_tenant_and_reloading(
         r".* Changing Active tenant to Broken state, reason: broken from test"
     )
 
+    tenant_state_metrics = ["pageserver_tenant_states_count", "pageserver_broken_tenants_count"]
+
     def only_int(samples: List[Sample]) -> Optional[int]:
         if len(samples) == 1:
             return int(samples[0].value)
@@ -760,7 +777,7 @@ def test_metrics_while_ignoring_broken_tenant_and_reloading(
     client.tenant_break(env.initial_tenant)
 
     def found_broken():
-        m = client.get_metrics()
+        m = client.get_metric_families(tenant_state_metrics)
         active = m.query_all("pageserver_tenant_states_count", {"state": "Active"})
         broken = m.query_all("pageserver_tenant_states_count", {"state": "Broken"})
         broken_set = m.query_all(
@@ -773,7 +790,7 @@ def test_metrics_while_ignoring_broken_tenant_and_reloading(
     client.tenant_ignore(env.initial_tenant)
 
     def found_cleaned_up():
-        m = client.get_metrics()
+        m = client.get_metric_families(tenant_state_metrics)
         broken = m.query_all("pageserver_tenant_states_count", {"state": "Broken"})
         broken_set = m.query_all(
             "pageserver_broken_tenants_count", {"tenant_id": str(env.initial_tenant)}
@@ -785,7 +802,7 @@ def test_metrics_while_ignoring_broken_tenant_and_reloading(
     env.pageserver.tenant_load(env.initial_tenant)
 
     def found_active():
-        m = client.get_metrics()
+        m = client.get_metric_families(tenant_state_metrics)
         active = m.query_all("pageserver_tenant_states_count", {"state": "Active"})
         broken_set = m.query_all(
             "pageserver_broken_tenants_count", {"tenant_id": str(env.initial_tenant)}